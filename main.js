@@ -1,6 +1,5 @@
 const { app, Tray, Menu, nativeImage } = require('electron');
 const path = require('path');
-const express = require('express');
 const puppeteer = require('puppeteer');
 const fs = require('fs');
 const { execFile } = require('child_process');
@@ -8,6 +7,9 @@ const { execFile } = require('child_process');
 const START_URL = 'https://wraith.software/';
 const HTTP_PORT = 3000;
 
+// Site profile ids by slot: translateY index 0..4, /control port 1..5
+const PROFILE_IDS = Object.freeze(['ProfileDef', 'Profile1', 'Profile2', 'Profile3', 'Profile4']);
+
 // ==================== PORTABLE DOSYA YOLU YÖNETİMİ ====================
 // Paketlenmiş mi kontrol et
 const isPackaged = app.isPackaged;
@@ -53,7 +55,10 @@ app.on('second-instance', () => {
 class LanguageManager {
     constructor() {
         this.langDir = langDir;
+        this.cache = {};
         this.config = this.loadConfig();
+        this.savedConfig = JSON.stringify(this.config, null, 2);
+        this.saving = Promise.resolve();
         this.currentLanguage = this.config.selectedLanguage || this.config.defaultLanguage;
         this.translations = this.loadLanguage(this.currentLanguage);
     }
@@ -70,17 +75,36 @@ class LanguageManager {
     }
 
     loadLanguage(lang) {
+        // Parsed once per language; switching back and forth reuses it
+        if (this.cache[lang]) {
+            return this.cache[lang];
+        }
+
         const langPath = path.join(this.langDir, `${lang}.json`);
         try {
             const data = fs.readFileSync(langPath, 'utf8');
-            return JSON.parse(data);
+            this.cache[lang] = this.flatten(JSON.parse(data));
+            return this.cache[lang];
         } catch (error) {
             // Fallback to Turkish if requested language can't be loaded
             if (lang !== 'tr') {
                 return this.loadLanguage('tr');
             }
-            return {};
+            return new Map();
+        }
+    }
+
+    // { tray: { exit: 'Exit' } } -> Map { 'tray' => {...}, 'tray.exit' => 'Exit' },
+    // so get() is a single lookup instead of walking the key path
+    flatten(obj, prefix = '', out = new Map()) {
+        for (const [k, v] of Object.entries(obj)) {
+            const key = prefix ? `${prefix}.${k}` : k;
+            out.set(key, v);
+            if (v && typeof v === 'object') {
+                this.flatten(v, key, out);
+            }
         }
+        return out;
     }
 
     setLanguage(lang) {
@@ -96,24 +120,31 @@ class LanguageManager {
 
     saveConfig() {
         const configPath = path.join(this.langDir, 'config.json');
-        try {
-            fs.writeFileSync(configPath, JSON.stringify(this.config, null, 2), 'utf8');
-        } catch (error) {
-            // Silently ignore errors when saving config
-        }
+        const data = JSON.stringify(this.config, null, 2);
+
+        // Nothing changed since the last write
+        if (data === this.savedConfig) return;
+
+        this.savedConfig = data;
+
+        // Write to a temp file and rename, so a crash can't leave a truncated config.
+        // Done asynchronously so the tray click isn't blocked on disk I/O, and
+        // chained so back-to-back saves land in order.
+        const tmpPath = `${configPath}.tmp`;
+        this.saving = this.saving
+            .then(() => fs.promises.writeFile(tmpPath, data, 'utf8'))
+            .then(() => fs.promises.rename(tmpPath, configPath))
+            .catch(() => {
+                // Silently ignore errors when saving config; retry on next save
+                if (this.savedConfig === data) this.savedConfig = null;
+            });
     }
 
     get(key, params = {}) {
-        const keys = key.split('.');
-        let value = this.translations;
-        
-        for (const k of keys) {
-            if (value && typeof value === 'object' && k in value) {
-                value = value[k];
-            } else {
-                return key;
-            }
+        if (!this.translations.has(key)) {
+            return key;
         }
+        let value = this.translations.get(key);
 
         if (typeof value === 'string' && params) {
             Object.keys(params).forEach(param => {
@@ -148,31 +179,54 @@ let isHidden = false;
 const forceKiosk = false;
 
 let loginCheckInterval = null;
-let profileCheckInterval = null;
+let loginPollingFallback = false;
+let profileCheckTimer = null;
 let loginNotificationSent = false;
 
-let trayMenuTemplate = [
-    { id: 'ProfileDef', label: 'Default', click: () => clickAndUpdate('ProfileDef') },
-    { id: 'Profile1', label: 'Profile 1', click: () => clickAndUpdate('Profile1') },
-    { id: 'Profile2', label: 'Profile 2', click: () => clickAndUpdate('Profile2') },
-    { id: 'Profile3', label: 'Profile 3', click: () => clickAndUpdate('Profile3') },
-    { id: 'Profile4', label: 'Profile 4', click: () => clickAndUpdate('Profile4') },
-    { type: 'separator' },
-    { label: languageManager.get('tray.refresh'), click: () => refreshTrayNames() },
-    { label: languageManager.get('tray.hideShow'), click: () => toggleChromiumWindow() },
-    { type: 'separator' },
-    { 
-        label: languageManager.get('tray.language'), 
-        submenu: languageManager.getAvailableLanguages().map(lang => ({
-            label: lang.name,
-            type: 'radio',
-            checked: languageManager.currentLanguage === lang.code,
-            click: () => changeLanguage(lang.code)
-        }))
-    },
-    { type: 'separator' },
-    { label: languageManager.get('tray.exit'), click: () => shutdownAndExit(0) }
-];
+// Profile switch queue (see queueProfileSwitch)
+let switchQueue = Promise.resolve();
+let pendingSwitch = null;
+
+// winctl.exe runner state (see runWinctl)
+let winctlRunning = false;
+let winctlPending = null;
+let winctlLast = null;
+
+// In-flight tray name refresh, shared by concurrent callers
+let trayNamesRefresh = null;
+
+// Profile id -> display name, kept in sync with the tray labels
+const DEFAULT_PROFILE_NAMES = Object.freeze(Object.fromEntries(
+    PROFILE_IDS.map((id, i) => [id, i === 0 ? 'Default' : `Profile ${i}`])
+));
+let profileNames = Object.assign({}, DEFAULT_PROFILE_NAMES);
+
+function buildTrayMenuTemplate() {
+    return [
+        ...PROFILE_IDS.map(id => ({
+            id,
+            label: DEFAULT_PROFILE_NAMES[id],
+            click: () => clickAndUpdate(id)
+        })),
+        { type: 'separator' },
+        { label: languageManager.get('tray.refresh'), click: () => refreshTrayNames() },
+        { label: languageManager.get('tray.hideShow'), click: () => toggleChromiumWindow() },
+        { type: 'separator' },
+        { 
+            label: languageManager.get('tray.language'), 
+            submenu: languageManager.getAvailableLanguages().map(lang => ({
+                label: lang.name,
+                type: 'radio',
+                checked: languageManager.currentLanguage === lang.code,
+                click: () => changeLanguage(lang.code)
+            }))
+        },
+        { type: 'separator' },
+        { label: languageManager.get('tray.exit'), click: () => shutdownAndExit(0) }
+    ];
+}
+
+let trayMenuTemplate = buildTrayMenuTemplate();
 
 // ==================== ORIGINAL FUNCTIONS ====================
 function showTrayNotification(title, body) {
@@ -202,8 +256,7 @@ async function getActiveProfileId() {
             if (isNaN(num)) return null;
             return Math.round(num / 100);
         });
-        const profileMap = ['ProfileDef', 'Profile1', 'Profile2', 'Profile3', 'Profile4'];
-        return profileMap[index] || null;
+        return PROFILE_IDS[index] || null;
     } catch {
         return null;
     }
@@ -218,22 +271,43 @@ function getChromiumPid() {
     }
 }
 
+// Only one winctl.exe runs at a time; while it does, only the latest
+// requested command is kept, so a burst of toggles ends in one transition
+function runWinctl(cmd) {
+    if (winctlRunning) {
+        winctlPending = cmd;
+        return;
+    }
+
+    const pid = getChromiumPid();
+    if (!pid) return;
+
+    winctlRunning = true;
+    // A hung winctl.exe is killed, so it can't block every later hide/show
+    execFile(WINCTL_PATH, [cmd, String(pid)], { windowsHide: true, timeout: 5000 }, (err) => {
+        winctlRunning = false;
+        // Only a run that succeeded makes a repeat of the same command redundant
+        winctlLast = err ? null : cmd;
+        const next = winctlPending;
+        winctlPending = null;
+        if (next && next !== winctlLast) {
+            runWinctl(next);
+        }
+    });
+}
+
 function hideChromiumWindow() {
     // winctl.exe yoksa gizleme yapma
     if (!winctlAvailable) return;
     
-    const pid = getChromiumPid();
-    if (!pid) return;
-    execFile(WINCTL_PATH, ['hide', String(pid)], { windowsHide: true }, () => {});
+    runWinctl('hide');
 }
 
 function showChromiumWindow() {
     // winctl.exe yoksa gösterme yapma
     if (!winctlAvailable) return;
     
-    const pid = getChromiumPid();
-    if (!pid) return;
-    execFile(WINCTL_PATH, ['show', String(pid)], { windowsHide: true }, () => {});
+    runWinctl('show');
 }
 
 function toggleChromiumWindow() {
@@ -256,9 +330,9 @@ async function shutdownAndExit(code = 0) {
             clearInterval(loginCheckInterval);
             loginCheckInterval = null;
         }
-        if (profileCheckInterval) {
-            clearInterval(profileCheckInterval);
-            profileCheckInterval = null;
+        if (profileCheckTimer) {
+            clearTimeout(profileCheckTimer);
+            profileCheckTimer = null;
         }
         if (server) {
             try {
@@ -267,11 +341,29 @@ async function shutdownAndExit(code = 0) {
             server = null;
         }
         if (browser) {
+            const closing = browser;
+            browser = null;
+            // Give Chromium 2 seconds to close cleanly, then kill it
+            let timer = null;
+            const timedOut = new Promise(resolve => {
+                timer = setTimeout(() => resolve(true), 2000);
+            });
             try {
-                await browser.close();
+                const slow = await Promise.race([closing.close().then(() => false), timedOut]);
+                if (slow) closing.process()?.kill();
             } catch (e) {}
-            browser = null;
+            clearTimeout(timer);
         }
+
+        // Let a pending language config write finish (up to 2 seconds)
+        let saveTimer = null;
+        await Promise.race([
+            languageManager.saving,
+            new Promise(resolve => {
+                saveTimer = setTimeout(resolve, 2000);
+            })
+        ]);
+        clearTimeout(saveTimer);
     } catch (e) {}
 
     try {
@@ -340,6 +432,27 @@ async function runClickById(id) {
     }
 }
 
+// Profile switches run one at a time, in the order they were requested.
+// Requests that pile up behind a running switch collapse into one slot:
+// only the newest is clicked, the ones it replaced resolve with null.
+function queueProfileSwitch(profileId) {
+    return new Promise(resolve => {
+        if (pendingSwitch) {
+            pendingSwitch.resolve(null);
+            pendingSwitch.profileId = profileId;
+            pendingSwitch.resolve = resolve;
+            return;
+        }
+
+        const next = { profileId, resolve };
+        pendingSwitch = next;
+        switchQueue = switchQueue.then(async () => {
+            pendingSwitch = null;
+            next.resolve(await runClickById(next.profileId));
+        }).catch(() => {});
+    });
+}
+
 function buildTray() {
     let iconPath = path.join(resourcePath, 'tray-icon.png');
     let image = null;
@@ -364,7 +477,17 @@ function updateTrayMenu() {
     tray.setContextMenu(menu);
 }
 
-async function refreshTrayNames() {
+// Callers that arrive while a refresh is running share its result
+function refreshTrayNames() {
+    if (!trayNamesRefresh) {
+        trayNamesRefresh = readTrayNames().finally(() => {
+            trayNamesRefresh = null;
+        });
+    }
+    return trayNamesRefresh;
+}
+
+async function readTrayNames() {
     if (!page) return null;
     try {
         const namesAndActive = await page.evaluate(() => {
@@ -383,15 +506,21 @@ async function refreshTrayNames() {
         });
 
         const { map, activeId } = namesAndActive;
+        let changed = false;
         trayMenuTemplate = trayMenuTemplate.map(item => {
             if (item.id && map[item.id]) {
+                if (item.label !== map[item.id]) changed = true;
+                profileNames[item.id] = map[item.id];
                 return Object.assign({}, item, {
                     label: map[item.id] || item.label
                 });
             }
             return item;
         });
-        updateTrayMenu();
+        // Only rebuild the native menu when a name actually changed
+        if (changed) {
+            updateTrayMenu();
+        }
         return activeId;
     } catch (e) {
         return null;
@@ -413,14 +542,14 @@ async function clickAndUpdate(profileId) {
             return;
         }
 
-        const ok = await runClickById(profileId);
+        const ok = await queueProfileSwitch(profileId);
+
+        // Update profile names (get from site) and tray UI
+        await refreshTrayNames();
+
         if (ok) {
             // IMMEDIATE notification (NO DELAY)
-            // Update profile names (get from site)
-            await refreshTrayNames();
-            
-            const activeProfile = trayMenuTemplate.find(item => item.id === profileId);
-            const profileName = activeProfile ? activeProfile.label : profileId;
+            const profileName = profileNames[profileId] || profileId;
             
             showTrayNotification(
                 languageManager.get('notifications.profileChanged'),
@@ -428,12 +557,11 @@ async function clickAndUpdate(profileId) {
             );
         }
     } catch (e) {}
-
-    // Update tray UI
-    await refreshTrayNames().catch(() => {});
 }
 
 function startHttpServer() {
+    // Loaded here rather than at startup: the server only comes up once the page is open
+    const express = require('express');
     const appServer = express();
     appServer.use(express.json());
     appServer.post('/control', async (req, res) => {
@@ -456,17 +584,19 @@ function startHttpServer() {
             return res.status(400).json({ error: 'invalid port. use 1..5 or 1s..5s' });
         }
 
-        const map = { 1: 'ProfileDef', 2: 'Profile1', 3: 'Profile2', 4: 'Profile3', 5: 'Profile4' };
-        if (!map[portNum]) {
+        const profileId = PROFILE_IDS[portNum - 1];
+        if (!profileId) {
             return res.status(400).json({ error: 'invalid port. use 1..5 or 1s..5s' });
         }
-        const profileId = map[portNum];
-        const ok = await runClickById(profileId);
+        const ok = await queueProfileSwitch(profileId);
         await refreshTrayNames().catch(() => {});
-        if (ok) {
+        if (ok === null) {
+            // Replaced by a newer request before it ran; its click never happened
+            res.json({ status: 'superseded' });
+        } else if (ok) {
             // If not in silent mode, send notification
             if (!silent) {
-                const profileName = trayMenuTemplate.find(item => item.id === profileId)?.label || profileId;
+                const profileName = profileNames[profileId] || profileId;
                 showTrayNotification(
                     languageManager.get('notifications.profileChanged'),
                     languageManager.get('messages.activeProfile', { profileName })
@@ -519,67 +649,108 @@ function setupCloseHandlers() {
 }
 
 // ==================== NEW LOGIN CHECK SYSTEM ====================
-async function quickTranslateYCheck() {
-    if (!page) return null;
-    try {
-        const translateY = await page.evaluate(() => {
-            return document.documentElement.style.getPropertyValue('--translateY');
-        });
-        return {
-            translateY: translateY,
-            isLoggedIn: translateY !== '',
-            profileIndex: translateY ? Math.round(parseFloat(translateY) / 100) || 0 : null
+// Runs inside the page: reports --translateY whenever the site changes it,
+// so login/logout is pushed to us instead of polled every second.
+function observeTranslateY() {
+    // Iframes have no --translateY of their own; only the top page reports
+    if (window !== window.top) return;
+    if (window.__wraithTranslateYObserved) return;
+    window.__wraithTranslateYObserved = true;
+
+    const install = () => {
+        const root = document.documentElement;
+        // A fresh document starts out blank before the site sets the value;
+        // only a blank that follows a real value in this document is a logout
+        let last = '';
+        const report = () => {
+            const value = root.style.getPropertyValue('--translateY');
+            if (value === last) return;
+            last = value;
+            window.onTranslateYChanged(value);
         };
-    } catch (error) {
-        return null;
+        new MutationObserver(report).observe(root, { attributes: true, attributeFilter: ['style'] });
+        report();
+    };
+
+    if (document.documentElement) {
+        install();
+    } else {
+        document.addEventListener('DOMContentLoaded', install, { once: true });
+    }
+}
+
+function onTranslateYChanged(translateY) {
+    const isLoggedIn = translateY !== '';
+
+    if (isLoggedIn && !loginNotificationSent) {
+        handleLoggedIn({
+            translateY: translateY,
+            isLoggedIn: true,
+            profileIndex: Math.round(parseFloat(translateY) / 100) || 0
+        });
+    } else if (!isLoggedIn && loginNotificationSent) {
+        // Logged out — wait for the next login
+        if (profileCheckTimer) {
+            clearTimeout(profileCheckTimer);
+            profileCheckTimer = null;
+        }
+        loginNotificationSent = false;
+
+        // Without the observer, nothing else will notice the next login
+        if (loginPollingFallback) {
+            startLoginPolling();
+        }
     }
 }
 
 async function startLoginMonitor() {
+    if (!page) return;
+
+    loginNotificationSent = false;
+
+    try {
+        await page.exposeFunction('onTranslateYChanged', onTranslateYChanged);
+        await page.evaluateOnNewDocument(observeTranslateY);
+        await page.evaluate(observeTranslateY);
+    } catch (e) {
+        // Observer couldn't be installed — fall back to checking every second
+        loginPollingFallback = true;
+        startLoginPolling();
+    }
+}
+
+function startLoginPolling() {
     if (loginCheckInterval) {
         clearInterval(loginCheckInterval);
     }
-    
-    loginNotificationSent = false;
-    
-    // Run first check immediately (after 1s)
-    setTimeout(async () => {
-        const result = await quickTranslateYCheck();
-        if (result && result.isLoggedIn) {
-            handleLoggedIn(result);
-        }
-    }, 1000);
-    
-    // Check every 1 second
+
     loginCheckInterval = setInterval(async () => {
-        const result = await quickTranslateYCheck();
-        
-        if (!result) return;
-        
-        if (result.isLoggedIn) {
+        if (!page) return;
+        try {
+            const translateY = await page.evaluate(() => {
+                return document.documentElement.style.getPropertyValue('--translateY');
+            });
+            if (translateY === '') return;
+
+            // Logged in — the profile check takes over until logout
             clearInterval(loginCheckInterval);
             loginCheckInterval = null;
-            
-            if (!loginNotificationSent) {
-                handleLoggedIn(result);
-            }
-        }
+            onTranslateYChanged(translateY);
+        } catch (e) {}
     }, 1000);
 }
 
 async function handleLoggedIn(loginInfo) {
     loginNotificationSent = true;
     
-    const profileMap = ['ProfileDef', 'Profile1', 'Profile2', 'Profile3', 'Profile4'];
-    const profileId = profileMap[loginInfo.profileIndex] || 'Profile1';
+    const profileId = PROFILE_IDS[loginInfo.profileIndex] || 'Profile1';
     
     // ONLY the first login has a 1 second delay
     setTimeout(async () => {
         // Update profile names (get from site)
         await refreshTrayNames();
         
-        const activeProfile = trayMenuTemplate.find(item => item.id === profileId);
-        const profileName = activeProfile ? activeProfile.label : 'Profile 1';
+        const profileName = profileNames[profileId] || 'Profile 1';
         
         // Send notification
         showTrayNotification(
@@ -593,60 +764,65 @@ async function handleLoggedIn(loginInfo) {
 }
 
 function startProfileCheck() {
-    if (profileCheckInterval) {
-        clearInterval(profileCheckInterval);
+    if (profileCheckTimer) {
+        clearTimeout(profileCheckTimer);
     }
     
-    // Check profile names every 5 seconds
-    profileCheckInterval = setInterval(async () => {
-        if (!page) return;
-        
-        // Check login state
-        const result = await quickTranslateYCheck();
-        if (!result || !result.isLoggedIn) {
-            // Logged out — switch back to login monitoring
-            clearInterval(profileCheckInterval);
-            profileCheckInterval = null;
-            loginNotificationSent = false;
-            startLoginMonitor();
-            return;
+    // Check profile names every 5 seconds, backing off to 30 seconds
+    // while they stay the same; any rename snaps back to 5 seconds.
+    // Compared against the previous check, so renames picked up by other
+    // refreshes in between also count.
+    let idleChecks = 0;
+    let lastNames = JSON.stringify(profileNames);
+
+    const check = async () => {
+        const timer = profileCheckTimer;
+
+        if (page) {
+            // Safety net: a logout that loads a new page never sets --translateY,
+            // so the observer has nothing to report
+            const translateY = await page.evaluate(() => {
+                return document.documentElement.style.getPropertyValue('--translateY');
+            }).catch(() => null);
+            if (translateY === '') {
+                onTranslateYChanged(translateY);
+                return;
+            }
+
+            // Refresh profile names
+            await refreshTrayNames().catch(() => {});
+            const names = JSON.stringify(profileNames);
+            idleChecks = names === lastNames ? idleChecks + 1 : 0;
+            lastNames = names;
         }
-        
-        // Refresh profile names
-        await refreshTrayNames().catch(() => {});
-    }, 5000);
+
+        // Stopped or restarted while refreshing
+        if (profileCheckTimer !== timer) return;
+
+        profileCheckTimer = setTimeout(check, Math.min(30000, 5000 + idleChecks * 5000));
+    };
+
+    profileCheckTimer = setTimeout(check, 5000);
 }
 
 // ==================== CHANGE LANGUAGE & REFRESH TRAY ====================
 function changeLanguage(langCode) {
+    // Re-selecting the current language changes nothing on screen
+    if (langCode === languageManager.currentLanguage) {
+        return true;
+    }
+
     if (languageManager.setLanguage(langCode)) {
         // Recreate the entire tray menu
-        trayMenuTemplate = [
-            { id: 'ProfileDef', label: 'Default', click: () => clickAndUpdate('ProfileDef') },
-            { id: 'Profile1', label: 'Profile 1', click: () => clickAndUpdate('Profile1') },
-            { id: 'Profile2', label: 'Profile 2', click: () => clickAndUpdate('Profile2') },
-            { id: 'Profile3', label: 'Profile 3', click: () => clickAndUpdate('Profile3') },
-            { id: 'Profile4', label: 'Profile 4', click: () => clickAndUpdate('Profile4') },
-            { type: 'separator' },
-            { label: languageManager.get('tray.refresh'), click: () => refreshTrayNames() },
-            { label: languageManager.get('tray.hideShow'), click: () => toggleChromiumWindow() },
-            { type: 'separator' },
-            { 
-                label: languageManager.get('tray.language'), 
-                submenu: languageManager.getAvailableLanguages().map(lang => ({
-                    label: lang.name,
-                    type: 'radio',
-                    checked: languageManager.currentLanguage === lang.code,
-                    click: () => changeLanguage(lang.code)
-                }))
-            },
-            { type: 'separator' },
-            { label: languageManager.get('tray.exit'), click: () => shutdownAndExit(0) }
-        ];
+        profileNames = Object.assign({}, DEFAULT_PROFILE_NAMES);
+        trayMenuTemplate = buildTrayMenuTemplate();
         
         // Update tray menu
         updateTrayMenu();
         tray.setToolTip(languageManager.get('tray.tooltip'));
+
+        // Put the site's profile names back without waiting for the next check
+        refreshTrayNames().catch(() => {});
         return true;
     }
     return false;